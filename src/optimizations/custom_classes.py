@@ -1,9 +1,12 @@
 """Custom classes for hacking and monkeypatching pyBNF."""
 
 import copy
-import concurrent.futures
+import functools
+import inspect
 import logging
+import sys
 
+from collections import deque
 from typing import Callable
 
 import numpy as np
@@ -14,12 +17,63 @@ import pybnf.config
 import pybnf.parse
 import pybnf.pset
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
 logger = logging.getLogger(__name__)
 
+if numba is not None:
+
+    @functools.lru_cache(maxsize=8)
+    def _njit(fun):
+        # Reusing the same dispatcher across optimizations avoids compiling the
+        # function and the batch kernel specialized on it again. The cache keeps the
+        # most recently compiled functions, and everything they reference, alive.
+        try:
+            return numba.njit(cache=True)(fun)
+        except RuntimeError:
+            # functions without a source file (e.g. defined in the interpreter) cannot
+            # be cached on disk
+            return numba.njit(fun)
+
+    @numba.njit(parallel=True)
+    def _batch_kernel(fun, data, params_matrix, out):
+        for i in numba.prange(params_matrix.shape[0]):
+            out[i] = fun(data, params_matrix[i])
+
+
+@functools.lru_cache(maxsize=None)
+def _xcols(n: int) -> tuple[str, ...]:
+    return tuple(sys.intern(f"x{i:010d}") for i in range(n))
+
+
+@functools.lru_cache(maxsize=None)
+def _ycols(n: int) -> tuple[str, ...]:
+    return tuple(sys.intern(f"y{i:010d}") for i in range(n))
+
+
+@functools.lru_cache(maxsize=32)
+def _make_headers(ncols_x: int, ncols_y: int) -> tuple[dict, dict]:
+    """
+    Create column names and header dicts for CustomData objects.
+
+    The dicts are shared between all CustomData objects of the same shape and must not
+    be modified.
+    """
+    colnames = ("time",) + _xcols(ncols_x) + _ycols(ncols_y)
+    cols = {c: i for i, c in enumerate(colnames)}
+    headers = {i: c for i, c in enumerate(colnames)}
+    return cols, headers
+
 
 class CustomData(pybnf.data.Data):
     """
-    TODO
+    Data object holding the inputs and outputs of a function.
+
+    Besides the combined array used by pyBNF, data created with `from_x_and_y` keeps the
+    inputs as separate array `_x`, see `get_data_arr`.
     """
 
     @classmethod
@@ -32,26 +86,25 @@ class CustomData(pybnf.data.Data):
         nrows_data, ncols_data = data.shape
         ncols_result = result.shape[1]
 
-        out = cls(
-            arr=np.hstack(
-                [np.arange(nrows_data).reshape((nrows_data, 1)), data, result]
-            )
+        # fill preallocated array instead of stacking temporaries
+        arr = np.empty(
+            (nrows_data, 1 + ncols_data + ncols_result),
+            dtype=np.result_type(data, result),
         )
+        arr[:, 0] = np.arange(nrows_data)
+        arr[:, 1 : 1 + ncols_data] = data
+        arr[:, 1 + ncols_data :] = result
+
+        out = cls(arr=arr)
         # init header
-        colnames = (
-            ["time"]
-            + [f"x{i:0{10}d}" for i in range(ncols_data)]
-            + [f"y{i:0{10}d}" for i in range(ncols_result)]
-        )
-        out.cols = {c: i for i, c in enumerate(colnames)}
-        out.headers = {i: c for i, c in enumerate(colnames)}
+        out.cols, out.headers = _make_headers(ncols_data, ncols_result)
         # set indvar
         out.indvar = "time"
 
         return out
 
     @classmethod
-    def from_x_and_y(cls, x, y):
+    def from_x_and_y(cls, x, y, dtype=np.float64):
         """
         Create custom Data object from x and y.
 
@@ -63,8 +116,11 @@ class CustomData(pybnf.data.Data):
           Inputs: 1D or 2D. If 2D, observations x inputs
         y
           Outputs: 1D or 2D. If 2D, observations x outputs
+        dtype
+          Floating point type of the data, e.g. `np.float32` to halve memory traffic.
+          The parameters passed to the function will have the same type.
         """
-        x, y = np.asarray(x), np.asarray(y)
+        x, y = np.asarray(x, dtype=dtype), np.asarray(y, dtype=dtype)
 
         if x.ndim == 1:
             x = np.atleast_2d(x).T
@@ -83,42 +139,60 @@ class CustomData(pybnf.data.Data):
         ncols_x, ncols_y = x.shape[1], y.shape[1]
 
         # make dummy t variable
-        t = np.atleast_2d(np.arange(x.shape[0])).T
+        t = np.arange(x.shape[0], dtype=dtype)
 
         # arrange data frame
-        xy = np.hstack([t, x, y])
+        xy = np.hstack([t[:, np.newaxis], x, y])
 
         # create output
         out = cls(arr=xy)
         # init header
-        colnames = (
-            ["time"]
-            + [f"x{i:0{10}d}" for i in range(ncols_x)]
-            + [f"y{i:0{10}d}" for i in range(ncols_y)]
-        )
-        out.cols = {c: i for i, c in enumerate(colnames)}
-        out.headers = {i: c for i, c in enumerate(colnames)}
+        out.cols, out.headers = _make_headers(ncols_x, ncols_y)
         # set indvar
         out.indvar = "time"
+        # the inputs are copied, so that neither the caller nor the function to
+        # optimize can change them during the optimization
+        out._x = np.array(x, dtype=dtype, order="C")
+        out._x.setflags(write=False)
 
         return out
 
     def get_data_arr(self):
-        data_indxs = [i for i, col in self.headers.items() if col.startswith("x")]
+        """
+        Return the inputs.
 
-        return self._data[:, data_indxs]
+        The array is not copied and is read-only.
+        """
+        return self._x
 
 
 class NpModel(pybnf.pset.Model):
+    # attributes shared by reference between copies of the model
+    _shared_attributes = ("fun", "_batch_results")
+
     def __init__(
         self,
         fun: Callable[[np.ndarray, np.ndarray], np.ndarray],
         data: CustomData,
         n_params: int,
         pset: pybnf.pset.PSet | None = None,
+        *,
+        jit: bool = False,
+        batched: bool = False,
+        probe_params: np.ndarray | None = None,
     ):
-        self.fun = fun
         self.data = data.get_data_arr()
+        self.jit = jit
+        self.batched = batched
+        # parameters at which the function is compiled and its output shape is checked,
+        # should lie within the bounds (e.g. their midpoints)
+        if probe_params is None:
+            probe_params = np.zeros(n_params)
+        probe_params = np.array(probe_params, dtype=self.data.dtype)
+        # a batched function takes a matrix with one parameter set per row
+        if batched:
+            probe_params = probe_params[np.newaxis]
+        self.fun = self._jit_compile(fun, self.data, probe_params) if jit else fun
         self.pset = pset
 
         self.suffixes = [("simulate", "_data")]
@@ -126,10 +200,88 @@ class NpModel(pybnf.pset.Model):
         self.file_path = "_optimization"
         self.name = "_optimization"
 
-        self.param_names = [f"v{i:0{10}d}__FREE" for i in range(n_params)]
+        self.param_names = [f"v{i:010d}__FREE" for i in range(n_params)]
+        # results of execute_batch, picked up by execute
+        self._batch_results = dict()
+        # set by execute_batches after a failed batch, to not retry on every round
+        self._batch_failed = False
+
+        # check the shape of the function output once, instead of on every call
+        probe = np.asarray(self.fun(self.data, probe_params))
+        if batched:
+            if probe.ndim != 3 or probe.shape[:2] != (1, self.data.shape[0]):
+                raise ValueError(
+                    "batched function has to return a 3D array of shape "
+                    f"(parameter sets, observations, outputs), found shape {probe.shape}"
+                )
+            probe = probe[0]
+        elif probe.ndim != 2 or probe.shape[0] != self.data.shape[0]:
+            raise ValueError(
+                "function has to return a 2D array of shape (observations, outputs), "
+                f"found shape {probe.shape}"
+            )
+        self._out_shape = probe.shape
+        self._out_dtype = probe.dtype
+
+    def _params_to_array(self, pset: pybnf.pset.PSet) -> np.ndarray:
+        """
+        Return the values of a parameter set as a new array, ordered as `param_names`.
+
+        Reads the values directly from the parameter set, instead of serializing them
+        to a string and parsing them again.
+        """
+        param_dict = pset._param_dict
+        return np.fromiter(
+            (param_dict[name].value for name in self.param_names),
+            dtype=self.data.dtype,
+            count=len(self.param_names),
+        )
+
+    @staticmethod
+    def _jit_compile(fun, data, probe_params):
+        """
+        Compile the user function with numba, if possible.
+
+        The function is called once on the actual data, so that the compilation happens
+        here and not during the first evaluation inside the optimization. The compiled
+        code is cached on disk by numba, and the dispatchers of the most recently
+        compiled functions are reused for later optimizations in this process. If numba
+        is not installed, `fun` is not a plain function (e.g. a `functools.partial`, a
+        bound method or a callable object) or it cannot be compiled in nopython mode,
+        the plain python function is returned.
+        """
+        if numba is None or isinstance(fun, numba.core.dispatcher.Dispatcher):
+            return fun
+        if not inspect.isfunction(fun):
+            return fun
+        try:
+            jitted = _njit(fun)
+            jitted(data, probe_params)
+        except Exception:
+            logger.warning(
+                "Could not compile function with numba, using python function",
+                exc_info=True,
+            )
+            return fun
+        return jitted
+
+    def __deepcopy__(self, memo):
+        # share the (compiled) function by reference, copying a numba dispatcher
+        # would trigger a recompilation
+        new = object.__new__(type(self))
+        memo[id(self)] = new
+        for key, value in self.__dict__.items():
+            if key in self._shared_attributes:
+                new.__dict__[key] = value
+            else:
+                new.__dict__[key] = copy.deepcopy(value, memo)
+        return new
 
     def copy_with_param_set(self, pset: pybnf.pset.PSet):
-        new = copy.deepcopy(self)
+        # only the parameter set differs between copies, everything else is shared.
+        # pyBNF does not modify data, suffixes, mutants or param_names of the copies.
+        new = object.__new__(type(self))
+        new.__dict__ = self.__dict__.copy()
         new.pset = pset
         return new
 
@@ -139,9 +291,48 @@ class NpModel(pybnf.pset.Model):
     def save_all(self, file_prefix):
         pass
 
+    def can_execute_batch(self) -> bool:
+        if self._batch_failed:
+            return False
+        return self.batched or (
+            self.jit
+            and numba is not None
+            and isinstance(self.fun, numba.core.dispatcher.Dispatcher)
+        )
+
+    def execute_batch(self, psets: list[pybnf.pset.PSet]):
+        """
+        Evaluate the function for multiple parameter sets in a single call.
+
+        Batched functions are called once with all parameter sets, otherwise the
+        function has to be compiled with numba and is evaluated in parallel. The
+        results are stored and picked up by `execute` for the respective parameter
+        sets, so that pyBNF still runs one job per parameter set.
+        """
+        params_matrix = np.empty(
+            (len(psets), len(self.param_names)), dtype=self.data.dtype
+        )
+        for i, pset in enumerate(psets):
+            params_matrix[i] = self._params_to_array(pset)
+
+        if self.batched:
+            out = self.fun(self.data, params_matrix)
+        else:
+            out = np.empty((len(psets),) + self._out_shape, dtype=self._out_dtype)
+            _batch_kernel(self.fun, self.data, params_matrix, out)
+
+        # pair all results first so a mismatch does not leave partial results
+        results = dict(zip(psets, out, strict=True))
+        self._batch_results.update(results)
+
     def execute(self, folder, filename, timeout):
-        params = np.fromstring(self.pset.values_to_string(), sep="\t")
-        res = np.atleast_2d(self.fun(self.data, params))
+        res = self._batch_results.pop(self.pset, None)
+        if res is None:
+            params = self._params_to_array(self.pset)
+            if self.batched:
+                res = self.fun(self.data, params[np.newaxis])[0]
+            else:
+                res = self.fun(self.data, params)
         data = CustomData.from_data_and_result(self.data, res)
         [suffix] = self.get_suffixes()
         return {suffix: data}
@@ -167,6 +358,8 @@ class CustomConfiguration(pybnf.config.Configuration):
     - "_custom_func"=function
     - "_custom_data"=data
     - "_custom_mockdusk"=bool
+    - "_custom_jit"=bool
+    - "_custom_batched"=bool
 
     These are automatically generated by the convienence wrapper in
     `optimizations.interface`.
@@ -254,12 +447,18 @@ class CustomConfiguration(pybnf.config.Configuration):
         if self.config["models"] != "np":
             return super()._load_models()
 
+        # the zero-padded parameter names sort in the order of NpModel.param_names
+        variables = sorted(self._load_variables(), key=lambda v: v.name)
+        midpoints = [(v.lower_bound + v.upper_bound) / 2 for v in variables]
         return {
             "_optimization": NpModel(
                 self.config["_custom_func"],
                 self.exp_data["_optimization"]["_data"],
-                len(self._load_variables()),
+                len(variables),
                 None,
+                jit=self.config.get("_custom_jit", False),
+                batched=self.config.get("_custom_batched", False),
+                probe_params=midpoints,
             )
         }
 
@@ -280,8 +479,13 @@ class FakeCluster:
     Fake cluster for the local, non-parallel execution of code.
     """
 
+    __slots__ = ("client",)
+
     def __init__(self, *args, **kwargs):
-        self.client = MockClient()
+        self.client = _mock_client()
+
+    def teardown(self):
+        pass
 
 
 class MockClient:
@@ -289,18 +493,18 @@ class MockClient:
     Mock of a distributed.Client object for the local, non-parallel execution of code.
     """
 
+    __slots__ = ()
+
     def __init__(self):
         pass
 
-    def submit(self, func, *args, **kwargs) -> concurrent.futures.Future:
+    def submit(self, func, *args, **kwargs) -> "_SyncFuture":
         # This does not fully comply with the pybnf code base, as there
         # `distributed.Future` objects are used. However, there is no convienent way
-        # to create those without a distributed client, so we are using the futures from
-        # concurrent.futures and monkeypatch the pybnf.algorithms.custom_as_completed
+        # to create those without a distributed client, so we are using minimal
+        # synchronous futures and monkeypatch the pybnf.algorithms.custom_as_completed
         # class to handle these futures
-        future = concurrent.futures.Future()
-        future.set_result(func(*args))
-        return future
+        return _SyncFuture(func, *args)
 
     def scatter(
         self,
@@ -320,6 +524,73 @@ class MockClient:
         pass
 
 
+@functools.lru_cache(maxsize=1)
+def _mock_client() -> MockClient:
+    # MockClient is stateless, so a single instance is shared by all FakeClusters
+    return MockClient()
+
+
+class _SyncFuture:
+    """
+    Minimal future for the local, non-parallel execution of code.
+
+    The computation runs only when the result is requested. This allows
+    `new_custom_as_completed` to evaluate the models of multiple submitted jobs
+    together, before the jobs themselves are run. pyBNF only calls `result` on these
+    futures, so the locking and state machine of `concurrent.futures.Future` are not
+    needed.
+    """
+
+    __slots__ = ("func", "args", "_result", "_done")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+        self._result = None
+        self._done = False
+
+    def done(self) -> bool:
+        return self._done
+
+    def result(self, timeout=None):
+        if not self._done:
+            self._result = self.func(*self.args)
+            self._done = True
+        return self._result
+
+
+def execute_batches(futures):
+    """
+    Evaluate the models of all pending jobs in a single batched call per model.
+
+    See `NpModel.execute_batch`. If the batched evaluation of a model fails, a warning
+    is logged, the model is evaluated separately for each job, and batching is
+    disabled for that model.
+    """
+    psets = dict()
+    for future in futures:
+        if not isinstance(future, _SyncFuture) or future.done():
+            continue
+        if not future.args or not isinstance(future.args[0], pybnf.algorithms.Job):
+            continue
+        job = future.args[0]
+        for model in job.models:
+            if isinstance(model, NpModel) and model.can_execute_batch():
+                psets.setdefault(model, []).append(job.params)
+
+    for model, model_psets in psets.items():
+        if len(model_psets) < 2:
+            continue
+        try:
+            model.execute_batch(model_psets)
+        except Exception:
+            logger.warning(
+                "Batched evaluation failed, evaluating jobs separately from now on",
+                exc_info=True,
+            )
+            model._batch_failed = True
+
+
 # monkeypatch pybnf code
 class new_custom_as_completed:
     """
@@ -327,10 +598,12 @@ class new_custom_as_completed:
 
     Original `custom_as_completed` return futures in the order they completed. In the
     modified code, futures are just used to wrap the results of computations, to uphold
-    the pybnf API. Therefore, all futures will already have completed and can be
-    returned as is.
+    the pybnf API. Therefore, futures can be returned in the order they were submitted.
+    Models of newly added jobs are evaluated together, see `execute_batches`.
     """
 
+    __slots__ = ("futures", "with_results")
+
     def __init__(
         self,
         futures=None,
@@ -341,22 +614,24 @@ class new_custom_as_completed:
         timeout=None,
     ):
         if futures is None:
-            self.futures = []
+            self.futures = deque()
         else:
-            self.futures = list(futures)
+            self.futures = deque(futures)
         self.with_results = with_results
+        execute_batches(self.futures)
 
     def update(self, futures):
         """
         Add multiple futures to the collection.
         """
-        for f in futures:
-            self.futures.append(f)
+        futures = list(futures)
+        self.futures.extend(futures)
+        execute_batches(futures)
 
     def __next__(self):
         if len(self.futures) == 0:
             raise StopIteration()
-        future = self.futures.pop(0)
+        future = self.futures.popleft()
         if self.with_results:
             return (future, future.result())
         return future
@@ -1,20 +1,66 @@
 """Module providing a usable interface to run optimizations."""
 
+import concurrent.futures
+import functools
 import os
-import shutil
+import tempfile
 
-from typing import Callable, List, Tuple
+from typing import Annotated, Callable, List, Literal, Tuple, Union
 
 import numpy as np
 import numpy.typing as npt
 import pandas as pd
-import pybnf
-import pybnf.cluster
-import pybnf.algorithms
 import pydantic
 import scipy
 
-from .custom_classes import CustomData, CustomConfiguration, FakeCluster
+_VAR_TYPES = frozenset({"uniform_var", "loguniform_var"})
+_DE_STRATEGIES = frozenset({"rand1", "rand2", "best1", "best2", "all1", "all2"})
+_OBJFUNCS = frozenset({"sos", "sod"})
+
+
+def _validate_var_type(var_type: str) -> str:
+    if var_type not in _VAR_TYPES:
+        raise ValueError(
+            f"var_type can only contain {sorted(_VAR_TYPES)}, found {var_type}"
+        )
+    return var_type
+
+
+def _validate_de_strategy(de_strategy: str) -> str:
+    if de_strategy not in _DE_STRATEGIES:
+        raise ValueError(f"de_strategy must be one of {sorted(_DE_STRATEGIES)}")
+    return de_strategy
+
+
+def _wrap_beta(beta):
+    if isinstance(beta, (int, float)):
+        return [
+            beta,
+        ]
+    return beta
+
+
+def _sort_unique(values: tuple) -> tuple:
+    return tuple(sorted(set(values)))
+
+
+def _validate_objfunc(objfunc: str) -> str:
+    # TODO chi_sq does not work atm? why?
+    if objfunc not in _OBJFUNCS:
+        raise ValueError(f"objfunc must be one of {sorted(_OBJFUNCS)}")
+    return objfunc
+
+
+VarType = Annotated[str, pydantic.AfterValidator(_validate_var_type)]
+DEStrategy = Annotated[str, pydantic.AfterValidator(_validate_de_strategy)]
+ObjFunc = Annotated[str, pydantic.AfterValidator(_validate_objfunc)]
+Beta = Annotated[List[pydantic.PositiveFloat], pydantic.BeforeValidator(_wrap_beta)]
+Prob = Annotated[float, pydantic.Field(ge=0.0, le=1.0)]
+Percent = Annotated[int, pydantic.Field(gt=0, lt=100)]
+Verbosity = Annotated[int, pydantic.Field(ge=0, le=2)]
+CredibleIntervals = Annotated[
+    Tuple[Percent, ...], pydantic.AfterValidator(_sort_unique)
+]
 
 
 class UniformParam(pydantic.BaseModel):
@@ -38,17 +84,10 @@ class UniformParam(pydantic.BaseModel):
     upper_bound : float
     """
 
-    var_type: str
+    var_type: VarType
     lower_bound: pydantic.FiniteFloat
     upper_bound: pydantic.FiniteFloat
 
-    @pydantic.field_validator("var_type")
-    def validate_var_types(cls, var_type):
-        valid = ["uniform_var", "loguniform_var"]
-        if var_type not in valid:
-            raise ValueError(f"var_type can only contain {valid}, found {var_type}")
-        return var_type
-
     @pydantic.model_validator(mode="after")
     def validate_bounds(self):
         assert (
@@ -59,7 +98,7 @@ class UniformParam(pydantic.BaseModel):
     def to_config_key_value_pair(
         self, i: int
     ) -> Tuple[Tuple[str, str], Tuple[float, float, bool]]:
-        return (self.var_type, f"v{i:0{10}d}__FREE"), (
+        return (self.var_type, f"v{i:010d}__FREE"), (
             self.lower_bound,
             self.upper_bound,
             True,
@@ -82,9 +121,12 @@ class ParamConfig(pydantic.BaseModel):
     params: List[UniformParam]
 
     def update_param_dict(self, d):
-        for i, p in enumerate(self.params):
-            key, value = p.to_config_key_value_pair(i)
-            d[key] = value
+        d.update(
+            {
+                (p.var_type, f"v{i:010d}__FREE"): (p.lower_bound, p.upper_bound, True)
+                for i, p in enumerate(self.params)
+            }
+        )
         d["n_params"] = len(self.params)
         return d
 
@@ -110,16 +152,49 @@ def all_equal_bounds(
     -------
     ParamConfig
     """
+    # validate a single parameter, all other parameters are identical copies of it and
+    # can skip validation
+    template = UniformParam(
+        var_type=var_type, lower_bound=lower_bound, upper_bound=upper_bound
+    )
     params = [
-        UniformParam(
-            var_type=var_type, lower_bound=lower_bound, upper_bound=upper_bound
+        UniformParam.model_construct(
+            var_type=template.var_type,
+            lower_bound=template.lower_bound,
+            upper_bound=template.upper_bound,
         )
         for _ in range(n_params)
     ]
-    return ParamConfig(params=params)
+    return ParamConfig.model_construct(params=params)
 
 
-class AlgConfig_DifferentialEvolution(pydantic.BaseModel):
+class _AlgConfig(pydantic.BaseModel):
+    """
+    Base class for algorithm configurations.
+    """
+
+    def _param_dict(self) -> dict:
+        # shallow alternative to model_dump. Lists are copied, as pyBNF modifies some
+        # of them in place (e.g. sorting `beta`).
+        d = dict()
+        for name in type(self).model_fields:
+            value = getattr(self, name)
+            d[name] = list(value) if isinstance(value, list) else value
+        return d
+
+    def update_param_dict(self, d) -> dict:
+        """
+        Update parameter dict with settings.
+
+        The field values are inserted into `d` without dumping the model, so `d` shares
+        all immutable values with this config. List fields are copied, so `d` can be
+        handed over to pyBNF without the config being changed.
+        """
+        d.update(self._param_dict())
+        return d
+
+
+class AlgConfig_DifferentialEvolution(_AlgConfig):
     """
     Configuration for Differential Evoluation algorithm.
 
@@ -149,31 +224,17 @@ class AlgConfig_DifferentialEvolution(pydantic.BaseModel):
     num_to_migrate : int
     """
 
-    fit_type: str = pydantic.Field(default="de", init_var=False)
-    mutation_rate: pydantic.confloat(ge=0.0, le=1.0) = 0.5
-    mutation_factor: pydantic.confloat(ge=0.0, le=1.0) = 1.0
-    stop_tolerance: pydantic.confloat(ge=0.0, le=1.0) = 0.002
-    de_strategy: str = "rand1"
+    fit_type: Literal["de"] = pydantic.Field(default="de", init_var=False)
+    mutation_rate: Prob = 0.5
+    mutation_factor: Prob = 1.0
+    stop_tolerance: Prob = 0.002
+    de_strategy: DEStrategy = "rand1"
     islands: int = 1
     migrate_every: int = 20
     num_to_migrate: int = 5
 
-    @pydantic.field_validator("de_strategy")
-    def validate_de_strategy(cls, de_strategy):
-        valid = ["rand1", "rand2", "best1", "best2", "all1", "all2"]
-        if de_strategy not in valid:
-            raise ValueError(f"objfunc must be one of {valid}")
-        return de_strategy
-
-    def update_param_dict(self, d) -> dict:
-        """
-        Update parameter dict with settings.
-        """
-        d.update(self.model_dump())
-        return d
-
 
-class AlgConfig_AsynchronousDifferentialEvolution(pydantic.BaseModel):
+class AlgConfig_AsynchronousDifferentialEvolution(_AlgConfig):
     """
     Configuration for Asynchronous Differential Evolution algorithm.
 
@@ -197,28 +258,14 @@ class AlgConfig_AsynchronousDifferentialEvolution(pydantic.BaseModel):
     de_strategy : str
     """
 
-    fit_type: str = pydantic.Field(default="ade", init_var=False)
-    mutation_rate: pydantic.confloat(ge=0.0, le=1.0) = 0.5
-    mutation_factor: pydantic.confloat(ge=0.0, le=1.0) = 1.0
-    stop_tolerance: pydantic.confloat(ge=0.0, le=1.0) = 0.002
-    de_strategy: str = "rand1"
+    fit_type: Literal["ade"] = pydantic.Field(default="ade", init_var=False)
+    mutation_rate: Prob = 0.5
+    mutation_factor: Prob = 1.0
+    stop_tolerance: Prob = 0.002
+    de_strategy: DEStrategy = "rand1"
 
-    @pydantic.field_validator("de_strategy")
-    def validate_de_strategy(cls, de_strategy):
-        valid = ["rand1", "rand2", "best1", "best2", "all1", "all2"]
-        if de_strategy not in valid:
-            raise ValueError(f"objfunc must be one of {valid}")
-        return de_strategy
 
-    def update_param_dict(self, d) -> dict:
-        """
-        Update parameter dict with settings.
-        """
-        d.update(self.model_dump())
-        return d
-
-
-class AlgConfig_ScatterSearch(pydantic.BaseModel):
+class AlgConfig_ScatterSearch(_AlgConfig):
     """
     Configuration for Scatter Search algorithm.
 
@@ -240,7 +287,7 @@ class AlgConfig_ScatterSearch(pydantic.BaseModel):
     reserve_size : int
     """
 
-    fit_type: str = pydantic.Field(default="ss", init_var=False)
+    fit_type: Literal["ss"] = pydantic.Field(default="ss", init_var=False)
     init_size: pydantic.NonNegativeInt | None = None
     local_min_limit: pydantic.NonNegativeInt = 5
     reserve_size: pydantic.NonNegativeInt | None = None
@@ -251,7 +298,7 @@ class AlgConfig_ScatterSearch(pydantic.BaseModel):
 
         Assumes that the dict already has the general settings incorporated.
         """
-        d.update(self.model_dump())
+        super().update_param_dict(d)
 
         # handle defaults
         if d["init_size"] is None:
@@ -262,7 +309,7 @@ class AlgConfig_ScatterSearch(pydantic.BaseModel):
         return d
 
 
-class AlgConfig_ParticleSwarm(pydantic.BaseModel):
+class AlgConfig_ParticleSwarm(_AlgConfig):
     """
     Configuration for Particle Swarm algorithm.
 
@@ -291,7 +338,7 @@ class AlgConfig_ParticleSwarm(pydantic.BaseModel):
     v_stop : float
     """
 
-    fit_type: str = pydantic.Field(default="pso", init_var=False)
+    fit_type: Literal["pso"] = pydantic.Field(default="pso", init_var=False)
     cognitive: pydantic.NonNegativeFloat = 1.5
     social: pydantic.NonNegativeFloat = 1.5
     particle_weight: pydantic.NonNegativeFloat = 0.7
@@ -317,7 +364,7 @@ class AlgConfig_ParticleSwarm(pydantic.BaseModel):
         """
         Update parameter dict with settings.
         """
-        d.update(self.model_dump())
+        super().update_param_dict(d)
 
         # set particle_weight_final to particle weight to disable adaptive particle swarm
         d["particle_weight_final"] = d["particle_weight"]
@@ -325,7 +372,7 @@ class AlgConfig_ParticleSwarm(pydantic.BaseModel):
         return d
 
 
-class AlgConfig_AdaptiveParticleSwarm(pydantic.BaseModel):
+class AlgConfig_AdaptiveParticleSwarm(_AlgConfig):
     """
     Configuration for Adaptive Particle Swarm algorithm.
 
@@ -359,7 +406,7 @@ class AlgConfig_AdaptiveParticleSwarm(pydantic.BaseModel):
     adaptive_rel_tol : float
     """
 
-    fit_type: str = pydantic.Field(default="pso", init_var=False)
+    fit_type: Literal["pso"] = pydantic.Field(default="pso", init_var=False)
     cognitive: pydantic.NonNegativeFloat = 1.5
     social: pydantic.NonNegativeFloat = 1.5
     particle_weight: pydantic.NonNegativeFloat = 0.7
@@ -383,16 +430,8 @@ class AlgConfig_AdaptiveParticleSwarm(pydantic.BaseModel):
         ), "particle_weight_final has to be less than particle_weight for adaptive particle swarm."
         return particle_weight_final
 
-    def update_param_dict(self, d) -> dict:
-        """
-        Update parameter dict with settings.
-        """
-        d.update(self.model_dump())
-
-        return d
-
 
-class AlgConfig_MetropolisHastingsMCMC(pydantic.BaseModel):
+class AlgConfig_MetropolisHastingsMCMC(_AlgConfig):
     """
     Configuration for Metropolis Hastings MCMC algorithm.
 
@@ -408,7 +447,8 @@ class AlgConfig_MetropolisHastingsMCMC(pydantic.BaseModel):
     sample_every : int
     burn_in : int
     output_hist_every : int
-    credible_intervals : List[int]
+    credible_intervals : Tuple[int, ...]
+        Sorted and without duplicates.
 
     Parameters
     ----------
@@ -417,42 +457,29 @@ class AlgConfig_MetropolisHastingsMCMC(pydantic.BaseModel):
     sample_every : int
     burn_in : int
     output_hist_every : int
-    credible_intervals : List[int]
+    credible_intervals : Tuple[int, ...]
+        Sorted and without duplicates.
     """
 
-    fit_type: str = pydantic.Field(default="mh", init_var=False)
+    fit_type: Literal["mh"] = pydantic.Field(default="mh", init_var=False)
     step_size: pydantic.PositiveFloat = 0.2
-    beta: pydantic.PositiveFloat | List[pydantic.PositiveFloat] = [
+    beta: Beta = [
         1.0,
     ]
     sample_every: pydantic.PositiveInt = 100
     burn_in: pydantic.NonNegativeInt = 10_000
     output_hist_every: pydantic.PositiveInt = 100
     hist_bins: pydantic.PositiveInt = 10
-    credible_intervals: List[pydantic.conint(gt=0, lt=100)] = [68, 95]
-
-    @pydantic.field_validator("beta")
-    def validate_beta(cls, beta):
-        if isinstance(beta, float):
-            return [
-                beta,
-            ]
-        return beta
+    credible_intervals: CredibleIntervals = (68, 95)
 
-    def update_param_dict(self, d) -> dict:
-        """
-        Update parameter dict with settings.
-        """
-        d.update(self.model_dump())
-
-        return d
 
-
-class AlgConfig_ParallelTempering(pydantic.BaseModel):
+class AlgConfig_ParallelTempering(_AlgConfig):
     """
     Configuration for Parallel Tempering algorithm.
 
-    If parameter `beta_range` is given, all values in `beta` are ignored.
+    If parameter `beta_range` is given, all values in `beta` are ignored. pyBNF expands
+    the range once, when the configuration is loaded, into a geometric ladder of
+    `population_size // reps_per_beta` betas.
 
     For a detailed description of the algorithm parameters, please refer to the pyBNF
     documtation (https://pybnf.readthedocs.io/en/latest/config_keys.html).
@@ -467,7 +494,8 @@ class AlgConfig_ParallelTempering(pydantic.BaseModel):
     burn_in : int
     output_hist_every : int
     hist_bins : int
-    credible_intervals : List[int]
+    credible_intervals : Tuple[int, ...]
+        Sorted and without duplicates.
     exchange_every : int
     reps_per_beta : int
     beta_range : Tuple[int, int] | None
@@ -480,35 +508,28 @@ class AlgConfig_ParallelTempering(pydantic.BaseModel):
     burn_in : int
     output_hist_every : int
     hist_bins : int
-    credible_intervals : List[int]
+    credible_intervals : Tuple[int, ...]
+        Sorted and without duplicates.
     exchange_every : int
     reps_per_beta : int
     beta_range : Tuple[int, int] | None
         If parameter `beta_range` is given, all values in `beta` are ignored.
     """
 
-    fit_type: str = pydantic.Field(default="pt", init_var=False)
+    fit_type: Literal["pt"] = pydantic.Field(default="pt", init_var=False)
     step_size: pydantic.PositiveFloat = 0.2
-    beta: pydantic.PositiveFloat | List[pydantic.PositiveFloat] = [
+    beta: Beta = [
         1.0,
     ]
     sample_every: pydantic.PositiveInt = 100
     burn_in: pydantic.NonNegativeInt = 10_000
     output_hist_every: pydantic.PositiveInt = 100
     hist_bins: pydantic.PositiveInt = 10
-    credible_intervals: List[pydantic.conint(gt=0, lt=100)] = [68, 95]
+    credible_intervals: CredibleIntervals = (68, 95)
     exchange_every: pydantic.PositiveInt = 20
     reps_per_beta: pydantic.PositiveInt = 1
     beta_range: Tuple[pydantic.PositiveFloat, pydantic.PositiveFloat] | None = None
 
-    @pydantic.field_validator("beta")
-    def validate_beta(cls, beta):
-        if isinstance(beta, float):
-            return [
-                beta,
-            ]
-        return beta
-
     @pydantic.model_validator(mode="after")
     def validate_betas(self):
         if self.beta_range is not None:
@@ -519,7 +540,7 @@ class AlgConfig_ParallelTempering(pydantic.BaseModel):
         """
         Update parameter dict with settings.
         """
-        d.update(self.model_dump())
+        super().update_param_dict(d)
 
         if self.beta_range is not None:
             del d["beta"]
@@ -529,7 +550,7 @@ class AlgConfig_ParallelTempering(pydantic.BaseModel):
         return d
 
 
-class AlgConfig_SimulatedAnnealing(pydantic.BaseModel):
+class AlgConfig_SimulatedAnnealing(_AlgConfig):
     """
     Configuration for Simulated Annealing algorithm.
 
@@ -553,32 +574,16 @@ class AlgConfig_SimulatedAnnealing(pydantic.BaseModel):
     cooling : float
     """
 
-    fit_type: str = pydantic.Field(default="sa", init_var=False)
+    fit_type: Literal["sa"] = pydantic.Field(default="sa", init_var=False)
     step_size: pydantic.PositiveFloat = 0.2
-    beta: pydantic.PositiveFloat | List[pydantic.PositiveFloat] = [
+    beta: Beta = [
         1.0,
     ]
     beta_max: pydantic.PositiveFloat = np.inf
     cooling: pydantic.PositiveFloat = 0.01
 
-    @pydantic.field_validator("beta")
-    def validate_beta(cls, beta):
-        if isinstance(beta, float):
-            return [
-                beta,
-            ]
-        return beta
 
-    def update_param_dict(self, d) -> dict:
-        """
-        Update parameter dict with settings.
-        """
-        d.update(self.model_dump())
-
-        return d
-
-
-class AlgConfig_AdaptiveMCMC(pydantic.BaseModel):
+class AlgConfig_AdaptiveMCMC(_AlgConfig):
     """
     Configuration for Adapative MCMC algorithm.
 
@@ -610,9 +615,9 @@ class AlgConfig_AdaptiveMCMC(pydantic.BaseModel):
     adaptive : int
     """
 
-    fit_type: str = pydantic.Field(default="am", init_var=False)
+    fit_type: Literal["am"] = pydantic.Field(default="am", init_var=False)
     step_size: pydantic.PositiveFloat = 0.2
-    beta: pydantic.PositiveFloat | List[pydantic.PositiveFloat] = [
+    beta: Beta = [
         1.0,
     ]
     sample_every: pydantic.PositiveInt = 100
@@ -623,21 +628,35 @@ class AlgConfig_AdaptiveMCMC(pydantic.BaseModel):
     adaptive: pydantic.PositiveInt = 10_000
     # TODO there are a few more of these parameters but probably not too important
 
-    @pydantic.field_validator("beta")
-    def validate_beta(cls, beta):
-        if isinstance(beta, float):
-            return [
-                beta,
-            ]
-        return beta
 
-    def update_param_dict(self, d) -> dict:
-        """
-        Update parameter dict with settings.
-        """
-        d.update(self.model_dump())
-
-        return d
+def _alg_config_tag(alg_config) -> str | None:
+    # Particle Swarm and Adaptive Particle Swarm share the fit type `pso`, only the
+    # adaptive variant sets `particle_weight_final`
+    if isinstance(alg_config, dict):
+        fit_type = alg_config.get("fit_type")
+        particle_weight_final = alg_config.get("particle_weight_final")
+    else:
+        fit_type = getattr(alg_config, "fit_type", None)
+        particle_weight_final = getattr(alg_config, "particle_weight_final", None)
+    if fit_type == "pso" and particle_weight_final is not None:
+        return "apso"
+    return fit_type
+
+
+AlgConfig = Annotated[
+    Union[
+        Annotated[AlgConfig_DifferentialEvolution, pydantic.Tag("de")],
+        Annotated[AlgConfig_AsynchronousDifferentialEvolution, pydantic.Tag("ade")],
+        Annotated[AlgConfig_ScatterSearch, pydantic.Tag("ss")],
+        Annotated[AlgConfig_ParticleSwarm, pydantic.Tag("pso")],
+        Annotated[AlgConfig_AdaptiveParticleSwarm, pydantic.Tag("apso")],
+        Annotated[AlgConfig_MetropolisHastingsMCMC, pydantic.Tag("mh")],
+        Annotated[AlgConfig_ParallelTempering, pydantic.Tag("pt")],
+        Annotated[AlgConfig_SimulatedAnnealing, pydantic.Tag("sa")],
+        Annotated[AlgConfig_AdaptiveMCMC, pydantic.Tag("am")],
+    ],
+    pydantic.Discriminator(_alg_config_tag),
+]
 
 
 class GeneralConfig(pydantic.BaseModel):
@@ -675,37 +694,41 @@ class GeneralConfig(pydantic.BaseModel):
     """
 
     param_config: ParamConfig
-    algorithm_config: AlgConfig_DifferentialEvolution | AlgConfig_AsynchronousDifferentialEvolution | AlgConfig_ScatterSearch | AlgConfig_ParticleSwarm | AlgConfig_AdaptiveParticleSwarm | AlgConfig_MetropolisHastingsMCMC | AlgConfig_ParallelTempering | AlgConfig_SimulatedAnnealing | AlgConfig_AdaptiveMCMC
-    objfunc: str = "sos"
+    algorithm_config: AlgConfig
+    objfunc: ObjFunc = "sos"
     population_size: pydantic.PositiveInt
     max_iterations: pydantic.PositiveInt
     min_objective: float = -np.inf
     disable_dusk: bool = True
     num_to_output: pydantic.PositiveInt = 5_000
-    verbosity: pydantic.conint(ge=0, le=2)
-
-    @pydantic.field_validator("objfunc")
-    def validate_objfunc(cls, objfunc):
-        valid = ["sos", "sod"]
-        # TODO chi_sq does not work atm? why?
-        if objfunc not in valid:
-            raise ValueError(f"objfunc must be one of {valid}")
-        return objfunc
+    verbosity: Verbosity
 
-    def generate_pybnf_config_dict(self, func: Callable, data: npt.NDArray[np.float_]):
-        config_dict = dict()
-
-        # hacked params
-        config_dict["models"] = "np"
-        config_dict["_optimization"] = ["_data"]
+    @classmethod
+    def from_dict(cls, d: dict) -> "GeneralConfig":
+        """
+        Create GeneralConfig from a (nested) dict of settings.
 
-        config_dict["_custom_func"] = func
-        config_dict["_custom_data"] = data
-        config_dict["_custom_disable_dusk"] = self.disable_dusk
+        Uses the validator compiled by pydantic when the class was created, so no schema
+        is built per call.
+        """
+        return cls.model_validate(d)
 
-        # general params
-        general_params = self.model_dump()
-        config_dict.update(general_params)
+    def generate_pybnf_config_dict(self, func: Callable, data: npt.NDArray[np.float_]):
+        config_dict = {
+            # hacked params
+            "models": "np",
+            "_optimization": ["_data"],
+            "_custom_func": func,
+            "_custom_data": data,
+            "_custom_disable_dusk": self.disable_dusk,
+            # general params, read directly from the already validated fields instead
+            # of dumping the whole model including the nested configs
+            **{
+                k: getattr(self, k)
+                for k in type(self).model_fields
+                if k not in ("param_config", "algorithm_config", "disable_dusk")
+            },
+        }
 
         # parameter params
         config_dict = self.param_config.update_param_dict(config_dict)
@@ -714,94 +737,132 @@ class GeneralConfig(pydantic.BaseModel):
         config_dict = self.algorithm_config.update_param_dict(config_dict)
 
         # clean up unnecessary parameters from
-        del config_dict["param_config"]
-        del config_dict["algorithm_config"]
         del config_dict["n_params"]
-        del config_dict["disable_dusk"]
         return config_dict
 
 
-def run_simple_optimization(func, inputs, outputs, general_config: GeneralConfig):
+def _assert_mcmc(param_dict: dict) -> None:
+    assert param_dict["burn_in"] <= param_dict["max_iterations"]
+    assert param_dict["sample_every"] <= param_dict["max_iterations"]
+
+
+def _assert_am(param_dict: dict) -> None:
+    _assert_mcmc(param_dict)
+    assert param_dict["adaptive"] <= param_dict["max_iterations"]
+
+
+@functools.lru_cache(maxsize=1)
+def _load_pybnf():
+    # pyBNF pulls in dask/distributed, so it is only imported once an optimization is
+    # run and not already for creating the configs. Importing the custom classes also
+    # applies their monkeypatches to pyBNF.
+    import pybnf.algorithms
+    import pybnf.cluster
+
+    from . import custom_classes
+
+    # fit_type -> (algorithm constructor, precondition on the parameter dict)
+    alg_dispatch = {
+        "de": (pybnf.algorithms.DifferentialEvolution, None),
+        "ade": (pybnf.algorithms.AsynchronousDifferentialEvolution, None),
+        "ss": (pybnf.algorithms.ScatterSearch, None),
+        "pso": (pybnf.algorithms.ParticleSwarm, None),
+        "mh": (pybnf.algorithms.BasicBayesMCMCAlgorithm, _assert_mcmc),
+        "pt": (pybnf.algorithms.BasicBayesMCMCAlgorithm, _assert_mcmc),
+        "sa": (
+            functools.partial(pybnf.algorithms.BasicBayesMCMCAlgorithm, sa=True),
+            None,
+        ),
+        "am": (pybnf.algorithms.Adaptive_MCMC, _assert_am),
+    }
+    return pybnf, custom_classes, alg_dispatch
+
+
+def run_simple_optimization(
+    func,
+    inputs,
+    outputs,
+    general_config: GeneralConfig,
+    *,
+    dtype=np.float64,
+    jit: bool = False,
+    batched: bool = False,
+):
     """
     Run simple optimization using pyBNF differential evoluation algorithm.
+
+    The inputs and the parameters are passed to `func` as arrays of type `dtype`. If
+    `jit` is set and numba is installed, `func` is compiled with numba, falling back
+    to the python function if it cannot be compiled in nopython mode.
+
+    If `batched` is set, `func` is vectorized over parameter sets: it is called with a
+    2D array of shape (parameter sets, parameters) and has to return a 3D array of shape
+    (parameter sets, observations, outputs). All parameter sets submitted together by
+    the algorithm are then evaluated in a single call.
     """
-    data = CustomData.from_x_and_y(inputs, outputs)
+    pybnf, custom_classes, alg_dispatch = _load_pybnf()
+
+    data = custom_classes.CustomData.from_x_and_y(inputs, outputs, dtype=dtype)
 
     # Create parameter dict
     ###########################################################################
 
     param_dict = general_config.generate_pybnf_config_dict(func, data)
-    pybnf_config = CustomConfiguration(param_dict)
-
-    match param_dict["fit_type"]:
-        case "de":
-            alg = pybnf.algorithms.DifferentialEvolution(pybnf_config)
-        case "ade":
-            alg = pybnf.algorithms.AsynchronousDifferentialEvolution(pybnf_config)
-        case "ss":
-            alg = pybnf.algorithms.ScatterSearch(pybnf_config)
-        case "pso":
-            alg = pybnf.algorithms.ParticleSwarm(pybnf_config)
-        case "mh":
-            assert param_dict["burn_in"] <= param_dict["max_iterations"]
-            assert param_dict["sample_every"] <= param_dict["max_iterations"]
-            alg = pybnf.algorithms.BasicBayesMCMCAlgorithm(pybnf_config)
-        case "pt":
-            assert param_dict["burn_in"] <= param_dict["max_iterations"]
-            assert param_dict["sample_every"] <= param_dict["max_iterations"]
-            alg = pybnf.algorithms.BasicBayesMCMCAlgorithm(pybnf_config)
-        case "sa":
-            alg = pybnf.algorithms.BasicBayesMCMCAlgorithm(pybnf_config, sa=True)
-        case "am":
-            assert param_dict["burn_in"] <= param_dict["max_iterations"]
-            assert param_dict["sample_every"] <= param_dict["max_iterations"]
-            assert param_dict["adaptive"] <= param_dict["max_iterations"]
-            alg = pybnf.algorithms.Adaptive_MCMC(pybnf_config)
-        case _:
-            raise RuntimeError(f'Unknown fit type: {param_dict["fit_type"]}')
-
-    #######################################################################################
-
-    # TODO set output dir to temporary dir and clean up afterwards
-    #
-    # TODO investigate how to handle unbound parameters
-    # TODO consider whether we only want uniform_var parameters
-
-    # # IMPORTANT: it is necessary to create pybnf_output/Simulations dir!
-    # # IMPORTANT: pybnf_output/Results seems also important!
-    os.makedirs(
-        os.path.join(pybnf_config.config["output_dir"], "Simulations"), exist_ok=True
-    )
-    os.makedirs(
-        os.path.join(pybnf_config.config["output_dir"], "Results"), exist_ok=True
-    )
-
-    if param_dict["_custom_disable_dusk"]:
-        cluster = FakeCluster()
-    else:
-        cluster = pybnf.cluster.Cluster(pybnf_config, "test", False, "info")
-    alg.run(cluster.client, resume=None, debug=False)
-
-    # load results
-    # TODO catch any errors during optimization, wrap in scipy.optimize.OptimizeResult
-    output = parse_outputs(pybnf_config.config)
-    output['nfev'] = alg.success_count
+    param_dict["_custom_jit"] = jit
+    param_dict["_custom_batched"] = batched
+
+    # all outputs of pyBNF are written to a temporary directory, which is removed
+    # after the results are parsed. Set TMPDIR to choose its location, e.g. a tmpfs.
+    with tempfile.TemporaryDirectory() as output_dir:
+        param_dict["output_dir"] = output_dir
+        pybnf_config = custom_classes.CustomConfiguration(param_dict)
+
+        try:
+            alg_cls, precondition = alg_dispatch[param_dict["fit_type"]]
+        except KeyError:
+            raise RuntimeError(f'Unknown fit type: {param_dict["fit_type"]}') from None
+        if precondition is not None:
+            precondition(param_dict)
+        alg = alg_cls(pybnf_config)
+
+        #######################################################################################
+
+        # TODO investigate how to handle unbound parameters
+        # TODO consider whether we only want uniform_var parameters
+
+        # # IMPORTANT: it is necessary to create pybnf_output/Simulations dir!
+        # # IMPORTANT: pybnf_output/Results seems also important!
+        os.makedirs(os.path.join(output_dir, "Simulations"), exist_ok=True)
+        os.makedirs(os.path.join(output_dir, "Results"), exist_ok=True)
+
+        if param_dict["_custom_disable_dusk"]:
+            cluster = custom_classes.FakeCluster()
+        else:
+            cluster = pybnf.cluster.Cluster(pybnf_config, "test", False, "info")
+        try:
+            alg.run(cluster.client, resume=None, debug=False)
+        finally:
+            cluster.teardown()
 
-    # delete dir
-    shutil.rmtree(pybnf_config.config["output_dir"])
+        # load results
+        # TODO catch any errors during optimization, wrap in scipy.optimize.OptimizeResult
+        output = parse_outputs(pybnf_config.config)
+        output['nfev'] = alg.success_count
 
     return output
 
 
 def parse_outputs(config_dir):
     output = dict()
+    # the results are sorted by objective value, only the best row is needed
     results = pd.read_table(
-        os.path.join(config_dir["output_dir"], "Results", "sorted_params_final.txt")
+        os.path.join(config_dir["output_dir"], "Results", "sorted_params_final.txt"),
+        nrows=1,
     )
 
     output["success"] = True
     # solution to optimization problem
-    output["x"] = results.iloc[0, 3:].to_numpy()
+    output["x"] = results.iloc[0, 3:].to_numpy(dtype=np.float64)
     # value of objective function
     output["fun"] = results.iloc[0, 2]
 
@@ -809,11 +870,19 @@ def parse_outputs(config_dir):
         "mh",
         "pt",
     ]:
-        for interval in config_dir["credible_intervals"]:
-            output[f"credible{interval}"] = pd.read_table(
-                os.path.join(
-                    config_dir["output_dir"], "Results", f"credible{interval}_final.txt"
-                )
+        intervals = config_dir["credible_intervals"]
+        paths = [
+            os.path.join(
+                config_dir["output_dir"], "Results", f"credible{interval}_final.txt"
             )
+            for interval in intervals
+        ]
+        # the tables are independent, read them concurrently
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(len(paths), 1)
+        ) as executor:
+            tables = executor.map(pd.read_table, paths)
+            for interval, table in zip(intervals, tables):
+                output[f"credible{interval}"] = table
 
     return scipy.optimize.OptimizeResult(**output)
@@ -0,0 +1,174 @@
+# SPDX-FileCopyrightText: 2023-present Philipp Junk <philipp.junk@ucdconnect.ie>
+#
+# SPDX-License-Identifier: MIT
+import functools
+import math
+
+import numpy as np
+import pybnf.algorithms
+import pybnf.pset
+import pytest
+
+from optimizations.custom_classes import (
+    CustomData,
+    MockClient,
+    NpModel,
+    execute_batches,
+)
+
+
+def linear(data, params, offset=0.0):
+    return data * params[0] + offset
+
+
+class Linear:
+    def __call__(self, data, params):
+        return data * params[0]
+
+    def method(self, data, params):
+        return data * params[0]
+
+
+def linear_batched(data, params):
+    return data * params[:, 0, np.newaxis, np.newaxis]
+
+
+def linear_batched_single(data, params):
+    if params.shape[0] > 1:
+        raise RuntimeError("only single parameter sets")
+    return linear_batched(data, params)
+
+
+def make_pset(value):
+    return pybnf.pset.PSet(
+        [pybnf.pset.FreeParameter("v0000000000__FREE", "uniform_var", 0.0, 10.0, value)]
+    )
+
+
+def submit_jobs(model, values, tmp_path):
+    client = MockClient()
+    futures = []
+    for i, value in enumerate(values):
+        pset = make_pset(value)
+        # as in pyBNF, all jobs share the model, which is copied when the job runs
+        job = pybnf.algorithms.Job(
+            [model],
+            pset,
+            f"job{i}",
+            str(tmp_path),
+            None,
+            None,
+            None,
+            None,
+        )
+        futures.append(client.submit(lambda job: job.params, job))
+    return futures
+
+
+@pytest.fixture
+def data():
+    return CustomData.from_x_and_y(np.arange(5.0), 2 * np.arange(5.0))
+
+
+@pytest.mark.parametrize(
+    "fun",
+    [functools.partial(linear, offset=0.0), Linear(), Linear().method],
+    ids=["partial", "callable_object", "bound_method"],
+)
+def test_jit_keeps_non_function_callables(data, fun):
+    model = NpModel(fun, data, 1, jit=True)
+    assert model.fun is fun
+
+
+def test_output_shape_is_probed_at_given_parameters(data):
+    def log_linear(data, params):
+        return data * math.log(params[0])
+
+    model = NpModel(log_linear, data, 1, jit=False, probe_params=[0.5])
+    assert model._out_shape == (5, 1)
+
+
+def test_futures_run_when_result_is_requested():
+    calls = []
+    future = MockClient().submit(lambda x: calls.append(x) or x, 1)
+    assert not future.done()
+    assert calls == []
+
+    assert future.result() == 1
+    assert future.result() == 1
+    assert future.done()
+    assert calls == [1]
+
+
+def test_batched_results_are_picked_up_per_pset(data, tmp_path):
+    model = NpModel(linear_batched, data, 1, batched=True, probe_params=[1.0])
+    futures = submit_jobs(model, [1.0, 2.0, 3.0], tmp_path)
+
+    execute_batches(futures)
+    assert len(model._batch_results) == 3
+    assert not any(future.done() for future in futures)
+
+    for future in futures:
+        pset = future.args[0].params
+        result = model.copy_with_param_set(pset).execute("", "", None)["_data"]
+        expected = np.arange(5.0) * pset["v0000000000__FREE"]
+        np.testing.assert_allclose(result.data[:, -1], expected)
+    assert len(model._batch_results) == 0
+
+
+def test_failed_batch_falls_back_to_single_evaluation(data, tmp_path, caplog):
+    model = NpModel(linear_batched_single, data, 1, batched=True, probe_params=[1.0])
+    futures = submit_jobs(model, [1.0, 2.0], tmp_path)
+
+    execute_batches(futures)
+    assert len(model._batch_results) == 0
+    assert len(caplog.records) == 1
+    assert caplog.records[0].levelname == "WARNING"
+    assert not model.can_execute_batch()
+
+    execute_batches(submit_jobs(model, [3.0, 4.0], tmp_path))
+    assert len(caplog.records) == 1
+
+    pset = futures[1].args[0].params
+    result = model.copy_with_param_set(pset).execute("", "", None)["_data"]
+    np.testing.assert_allclose(result.data[:, -1], 2 * np.arange(5.0))
+
+
+def test_jit_batch_matches_single_evaluation(data):
+    pytest.importorskip("numba")
+    model = NpModel(linear, data, 1, jit=True, probe_params=[1.0])
+    assert model.can_execute_batch()
+
+    psets = [make_pset(value) for value in [1.0, 2.0, 3.0]]
+    expected = [model.copy_with_param_set(pset).execute("", "", None) for pset in psets]
+    model.execute_batch(psets)
+    assert len(model._batch_results) == 3
+
+    for pset, single in zip(psets, expected, strict=True):
+        batched = model.copy_with_param_set(pset).execute("", "", None)
+        np.testing.assert_allclose(batched["_data"].data, single["_data"].data)
+    assert len(model._batch_results) == 0
+
+
+def scale_in_place(data, params):
+    data *= params[0]
+    return data
+
+
+def test_function_cannot_modify_data():
+    x = np.array([1.0, 2.0, 3.0])
+    data = CustomData.from_x_and_y(x, x)
+    with pytest.raises(ValueError, match="read-only"):
+        NpModel(scale_in_place, data, 1, probe_params=[2.0])
+    np.testing.assert_array_equal(x, [1.0, 2.0, 3.0])
+
+
+def first_row_only(data, params):
+    return linear_batched(data, params[:1])
+
+
+def test_batch_with_wrong_number_of_results_fails(data):
+    model = NpModel(first_row_only, data, 1, batched=True, probe_params=[1.0])
+    with pytest.raises(ValueError):
+        model.execute_batch([make_pset(1.0), make_pset(2.0)])
+    assert len(model._batch_results) == 0
@@ -0,0 +1,120 @@
+# SPDX-FileCopyrightText: 2023-present Philipp Junk <philipp.junk@ucdconnect.ie>
+#
+# SPDX-License-Identifier: MIT
+import numpy as np
+import pydantic
+import pytest
+
+import optimizations
+
+X = np.arange(-5.0, 6.0)
+Y = 0.5 * X**2 + X + 3.0
+
+
+def parabola(data, params):
+    return params[0] * data**2 + params[1] * data + params[2]
+
+
+def parabola_batched(data, params):
+    a, b, c = (params[:, i, np.newaxis, np.newaxis] for i in range(3))
+    return a * data**2 + b * data + c
+
+
+def general_config(algorithm_config, **kwargs):
+    return optimizations.GeneralConfig(
+        param_config=optimizations.all_equal_bounds(3, "uniform_var", -10.0, 10.0),
+        algorithm_config=algorithm_config,
+        population_size=10,
+        max_iterations=20,
+        verbosity=0,
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize("func, batched", [(parabola, False), (parabola_batched, True)])
+def test_differential_evolution(func, batched):
+    config = general_config(optimizations.AlgConfig_DifferentialEvolution())
+    result = optimizations.run_simple_optimization(func, X, Y, config, batched=batched)
+
+    assert result.success
+    assert result.x.shape == (3,)
+    assert np.all((result.x >= -10.0) & (result.x <= 10.0))
+    assert np.isfinite(result.fun)
+    assert result.nfev > 0
+
+
+class RecordingParabola:
+    # defined at module level, as pyBNF pickles the function for its backups
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, data, params):
+        self.batch_sizes.append(params.shape[0])
+        return parabola_batched(data, params)
+
+
+def test_batched_function_is_called_with_whole_population():
+    func = RecordingParabola()
+    config = general_config(optimizations.AlgConfig_DifferentialEvolution())
+    optimizations.run_simple_optimization(func, X, Y, config, batched=True)
+
+    assert max(func.batch_sizes) == 10
+
+
+@pytest.mark.parametrize("func, batched", [(parabola, False), (parabola_batched, True)])
+def test_metropolis_hastings(func, batched):
+    config = general_config(
+        optimizations.AlgConfig_MetropolisHastingsMCMC(
+            burn_in=5, sample_every=5, credible_intervals=[95, 68]
+        )
+    )
+    result = optimizations.run_simple_optimization(func, X, Y, config, batched=batched)
+
+    assert result.x.shape == (3,)
+    assert {"credible68", "credible95"} <= set(result)
+
+
+@pytest.mark.parametrize(
+    "algorithm_config, expected",
+    [
+        ({"fit_type": "pso"}, optimizations.AlgConfig_ParticleSwarm),
+        (
+            {"fit_type": "pso", "particle_weight_final": 0.5},
+            optimizations.AlgConfig_AdaptiveParticleSwarm,
+        ),
+        (
+            optimizations.AlgConfig_AdaptiveParticleSwarm(),
+            optimizations.AlgConfig_AdaptiveParticleSwarm,
+        ),
+        ({"fit_type": "mh"}, optimizations.AlgConfig_MetropolisHastingsMCMC),
+    ],
+)
+def test_algorithm_config_discriminator(algorithm_config, expected):
+    config = optimizations.GeneralConfig.from_dict(
+        {
+            "param_config": optimizations.all_equal_bounds(1, "uniform_var", 0.0, 1.0),
+            "algorithm_config": algorithm_config,
+            "population_size": 10,
+            "max_iterations": 10,
+            "verbosity": 0,
+        }
+    )
+    assert type(config.algorithm_config) is expected
+
+
+@pytest.mark.parametrize("algorithm_config", [{"fit_type": "unknown"}, {}])
+def test_algorithm_config_discriminator_rejects_invalid_tags(algorithm_config):
+    with pytest.raises(pydantic.ValidationError):
+        general_config(algorithm_config)
+
+
+def test_credible_intervals_are_sorted_and_unique():
+    config = optimizations.AlgConfig_ParallelTempering(credible_intervals=[95, 68, 95])
+    assert config.credible_intervals == (68, 95)
+
+
+@pytest.mark.parametrize("interval", [0, 100])
+def test_credible_intervals_are_percentages(interval):
+    with pytest.raises(pydantic.ValidationError):
+        optimizations.AlgConfig_MetropolisHastingsMCMC(credible_intervals=[interval])